@@ -15,11 +15,16 @@ async def app():
 
 
 def main():
+    backend_options: dict[str, bool] = {}
     if sys.version_info[0] == 3 and sys.version_info[1] >= 8 and sys.platform.startswith('win'):
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
         logger.debug('Using Windows-specific event loop policy')
+    else:
+        # uvloop speeds up the websocket-heavy streaming commands
+        backend_options['use_uvloop'] = True
+        logger.debug('Using uvloop event loop')
 
     app.add_command(option)
     app.add_command(portfolio, name='pf')
 
-    app(_anyio_backend='asyncio')
+    app(_anyio_backend='asyncio', _anyio_backend_options=backend_options)
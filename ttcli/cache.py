@@ -0,0 +1,83 @@
+import os
+import re
+import time
+from contextlib import suppress
+from urllib.parse import quote
+
+from pydantic import ValidationError
+from tastytrade.instruments import NestedFutureOptionChain, NestedOptionChain
+from tastytrade.utils import today_in_new_york
+
+from ttcli.utils import RenewableSession, logger, write_atomic
+
+CHAIN_CACHE_PATH = '.config/ttcli/cache/chains'
+
+
+class FileCache:
+    # one JSON file per key in the given directory, plus an in-memory copy of
+    # everything read or written during this process
+    def __init__(self, path: str):
+        self.path = path
+        self._memory: dict[str, tuple[float, str]] = {}
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f'{key}.json')
+
+    def get(self, key: str, max_age: float | None = None) -> str | None:
+        if key not in self._memory:
+            try:
+                with open(self._file(key)) as f:
+                    self._memory[key] = (os.fstat(f.fileno()).st_mtime, f.read())
+            except FileNotFoundError:
+                return None
+            except (OSError, UnicodeDecodeError):
+                logger.debug(f'Ignoring unreadable cache entry {key}')
+                return None
+        written, value = self._memory[key]
+        if max_age is not None and time.time() - written > max_age:
+            return None
+        return value
+
+    def set(self, key: str, value: str, stale: re.Pattern[str] | None = None):
+        self._memory[key] = (time.time(), value)
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            # clean up other entries for the same symbol
+            if stale is not None:
+                for name in os.listdir(self.path):
+                    if stale.fullmatch(name) and name != f'{key}.json':
+                        with suppress(FileNotFoundError):  # another process got it first
+                            os.remove(os.path.join(self.path, name))
+            write_atomic(self._file(key), value)
+        except OSError as e:
+            # the value was fetched fine, so a read-only or full disk isn't fatal
+            logger.debug(f'Unable to write cache entry {key}: {e}')
+
+
+chain_cache = FileCache(os.path.join(os.path.expanduser('~'), CHAIN_CACHE_PATH))
+
+
+def cached_get_chain(
+    session: RenewableSession,
+    symbol: str
+) -> NestedOptionChain | NestedFutureOptionChain:
+    model: type[NestedOptionChain | NestedFutureOptionChain]
+    model = NestedFutureOptionChain if symbol[0] == '/' else NestedOptionChain
+    # entries last until the New York trading day rolls over, or sooner if a TTL is set
+    ttl = session.config.getfloat('option', 'chain-cache-ttl-minutes', fallback=None)
+    # quote the symbol so futures and share classes (BRK/B) map to unique names
+    name = quote(symbol, safe='')
+    key = f'{name}_{today_in_new_york():%Y%m%d}'
+    raw = chain_cache.get(key, None if ttl is None else ttl * 60)
+    if raw is not None:
+        try:
+            chain = model.model_validate_json(raw)
+            logger.debug(f'Using cached option chain for {symbol}')
+            return chain
+        except ValidationError:
+            # written by an incompatible tastytrade version, refetch
+            logger.debug(f'Ignoring stale cached option chain for {symbol}')
+    chain = model.get_chain(session, symbol)
+    stale = re.compile(rf'{re.escape(name)}_\d{{8}}\.json')
+    chain_cache.set(key, chain.model_dump_json(by_alias=True), stale=stale)
+    return chain
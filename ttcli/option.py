@@ -1,11 +1,15 @@
+import asyncio
+import bisect
 from decimal import Decimal
-from typing import Optional
+from operator import attrgetter
+from typing import Any, Literal, Optional
 
 import asyncclick as click
+import numpy as np
 from rich.console import Console
 from rich.table import Table
 from tastytrade import DXLinkStreamer
-from tastytrade.dxfeed import EventType, Greeks, Quote
+from tastytrade.dxfeed import EventType, Greeks, Quote, Summary, Trade
 from tastytrade.instruments import (Future, FutureOption,
                                     NestedFutureOptionChain,
                                     NestedFutureOptionChainExpiration,
@@ -16,113 +20,154 @@ from tastytrade.order import (NewOrder, OrderAction, OrderTimeInForce,
 from tastytrade.utils import get_tasty_monthly
 from datetime import datetime
 
-from ttcli.utils import (ZERO, RenewableSession, get_confirmation, is_monthly,
-                         print_error, print_warning, test_order_handle_errors)
+from ttcli.cache import cached_get_chain
+from ttcli.utils import (HUNDRED, TWO, ZERO, RenewableSession, ainput,
+                         get_confirmation, is_monthly, print_error,
+                         print_warning, test_order_handle_errors)
 
 
 def round_to_width(x, base=Decimal(1)):
     return base * round(x / base)
 
 
-def choose_expiration(
+def closest_delta_index(greeks: list[Greeks], delta: int) -> int:
+    deltas = np.fromiter((g.delta for g in greeks), dtype=np.float64, count=len(greeks))
+    return int(np.argmin(np.abs(deltas * 100 - delta)))
+
+
+def fetch_options(
+    sesh: RenewableSession,
+    symbol: str,
+    tt_symbols: list[str]
+) -> asyncio.Task[list[Option] | list[FutureOption]]:
+    # scheduled right away so the lookup runs while the user is typing the price
+    if symbol[0] == '/':  # futures options
+        return asyncio.create_task(asyncio.to_thread(FutureOption.get_future_options, sesh, tt_symbols))
+    return asyncio.create_task(asyncio.to_thread(Option.get_options, sesh, tt_symbols))
+
+
+async def open_chain_and_streamer(
+    sesh: RenewableSession,
+    symbol: str
+) -> tuple[NestedOptionChain | NestedFutureOptionChain, DXLinkStreamer]:
+    # fetch the chain while the streamer connects, closing the streamer again
+    # if the chain can't be fetched
+    chain, streamer = await asyncio.gather(
+        asyncio.to_thread(cached_get_chain, sesh, symbol),
+        DXLinkStreamer.create(sesh),
+        return_exceptions=True
+    )
+    if isinstance(streamer, BaseException):
+        raise streamer
+    if isinstance(chain, BaseException):
+        await streamer.close()
+        raise chain
+    return chain, streamer
+
+
+async def choose_expiration(
     chain: NestedOptionChain,
     include_weeklies: bool = False
 ) -> NestedOptionChainExpiration:
-    exps = [e for e in chain.expirations]
-    if not include_weeklies:
-        exps = [e for e in exps if is_monthly(e.expiration_date)]
-    exps.sort(key=lambda e: e.expiration_date)
-    default = get_tasty_monthly()
-    default_option = None
-    for i, exp in enumerate(exps):
-        if exp.expiration_date == default:
-            default_option = exp
-            print(f'{i + 1}) {exp.expiration_date} (default)')
-        else:
-            print(f'{i + 1}) {exp.expiration_date}')
+    exps = sorted(
+        (e for e in chain.expirations if include_weeklies or is_monthly(e.expiration_date)),
+        key=lambda e: e.expiration_date
+    )
+    if len(exps) == 1:
+        return exps[0]
+    dates = [e.expiration_date for e in exps]
+    try:
+        default = dates.index(get_tasty_monthly())
+    except ValueError:
+        default = 0
+    print('\n'.join(
+        f'{i + 1}) {day} (default)' if i == default else f'{i + 1}) {day}'
+        for i, day in enumerate(dates)
+    ))
     choice = 0
     while choice not in range(1, len(exps) + 1):
         try:
-            raw = input('Please choose an expiration: ')
+            raw = await ainput('Please choose an expiration: ')
             choice = int(raw)
         except ValueError:
-            return default_option
+            return exps[default]
 
     return exps[choice - 1]
 
 
-def choose_futures_expiration(
+async def choose_futures_expiration(
     chain: NestedFutureOptionChain,
     include_weeklies: bool = False
 ) -> NestedFutureOptionChainExpiration:
-    chain = chain.option_chains[0]
-    if include_weeklies:
-        exps = [e for e in chain.expirations]
-    else:
-        exps = [e for e in chain.expirations if e.expiration_type != 'Weekly']
-    exps.sort(key=lambda e: e.expiration_date)
+    exps = sorted(
+        (e for e in chain.option_chains[0].expirations
+         if include_weeklies or e.expiration_type != 'Weekly'),
+        key=lambda e: e.expiration_date
+    )
+    if len(exps) == 1:
+        return exps[0]
     # find closest to 45 DTE
-    default = min(exps, key=lambda e: abs(e.days_to_expiration - 45))
-    for i, exp in enumerate(exps):
-        if exp == default:
-            print(f'{i + 1}) {exp.expiration_date} [{exp.underlying_symbol}] (default)')
-        else:
-            print(f'{i + 1}) {exp.expiration_date} [{exp.underlying_symbol}]')
+    default = min(range(len(exps)), key=lambda i: abs(exps[i].days_to_expiration - 45))
+    print('\n'.join(
+        f'{i + 1}) {exp.expiration_date} [{exp.underlying_symbol}] (default)' if i == default
+        else f'{i + 1}) {exp.expiration_date} [{exp.underlying_symbol}]'
+        for i, exp in enumerate(exps)
+    ))
     choice = 0
     while choice not in range(1, len(exps) + 1):
         try:
-            raw = input('Please choose an expiration: ')
+            raw = await ainput('Please choose an expiration: ')
             choice = int(raw)
         except ValueError:
-            return default
+            return exps[default]
 
     return exps[choice - 1]
 
 
+async def listen_events(
+    event_type: EventType,
+    expected: set[str],
+    streamer: DXLinkStreamer
+) -> dict[str, Any]:
+    event_dict = {}
+    remaining = set(expected)
+    async for event in streamer.listen(event_type):
+        if event.eventSymbol in remaining:
+            event_dict[event.eventSymbol] = event
+            remaining.discard(event.eventSymbol)
+            if not remaining:
+                break
+    # stop the feed so later listeners don't have to wade through stale events
+    await streamer.unsubscribe(event_type, list(expected))
+    return event_dict
+
+
 async def listen_quotes(
-    n_quotes: int,
-    streamer: DXLinkStreamer,
-    skip: str | None = None
+    expected: set[str],
+    streamer: DXLinkStreamer
 ) -> dict[str, Quote]:
-    quote_dict = {}
-    async for quote in streamer.listen(EventType.QUOTE):
-        if quote.eventSymbol != skip:
-            quote_dict[quote.eventSymbol] = quote
-        if len(quote_dict) == n_quotes:
-            return quote_dict
+    return await listen_events(EventType.QUOTE, expected, streamer)
 
 
 async def listen_greeks(
-    n_greeks: int,
+    expected: set[str],
     streamer: DXLinkStreamer
 ) -> dict[str, Greeks]:
-    greeks_dict = {}
-    async for greeks in streamer.listen(EventType.GREEKS):
-        greeks_dict[greeks.eventSymbol] = greeks
-        if len(greeks_dict) == n_greeks:
-            return greeks_dict
+    return await listen_events(EventType.GREEKS, expected, streamer)
 
 
 async def listen_summaries(
-    n_summaries: int,
+    expected: set[str],
     streamer: DXLinkStreamer
-) -> dict[str, Quote]:
-    summary_dict = {}
-    async for summary in streamer.listen(EventType.SUMMARY):
-        summary_dict[summary.eventSymbol] = summary
-        if len(summary_dict) == n_summaries:
-            return summary_dict
+) -> dict[str, Summary]:
+    return await listen_events(EventType.SUMMARY, expected, streamer)
 
 
 async def listen_trades(
-    n_trades: int,
+    expected: set[str],
     streamer: DXLinkStreamer
-) -> dict[str, Quote]:
-    trade_dict = {}
-    async for trade in streamer.listen(EventType.TRADE):
-        trade_dict[trade.eventSymbol] = trade
-        if len(trade_dict) == n_trades:
-            return trade_dict
+) -> dict[str, Trade]:
+    return await listen_events(EventType.TRADE, expected, streamer)
 
 
 @click.group(chain=True, help='Buy, sell, and analyze options.')
@@ -130,17 +175,21 @@ async def option():
     pass
 
 
-@option.command(help='Buy or sell calls with the given parameters.')
-@click.option('-s', '--strike', type=Decimal, help='The chosen strike for the option.')
-@click.option('-d', '--delta', type=int, help='The chosen delta for the option.')
-@click.option('-w', '--width', type=int, help='Turns the order into a spread with the given width.')
-@click.option('--gtc', is_flag=True, help='Place a GTC order instead of a day order.')
-@click.option('--weeklies', is_flag=True, help='Show all expirations, not just monthlies.')
-@click.option('--dte', type=int, help='Days to expiration for the option.')
-@click.argument('symbol', type=str)
-@click.argument('quantity', type=int)
-async def call(symbol: str, quantity: int, strike: Optional[Decimal] = None, width: Optional[int] = None,
-               gtc: bool = False, weeklies: bool = False, delta: Optional[int] = None, dte: Optional[int] = None):
+async def _single_leg(
+    side: Literal['call', 'put'],
+    symbol: str,
+    quantity: int,
+    strike: Decimal | None,
+    width: int | None,
+    gtc: bool,
+    weeklies: bool,
+    delta: int | None,
+    dte: int | None
+):
+    is_call = side == 'call'
+    streamer_symbol = attrgetter(f'{side}_streamer_symbol')
+    tt_symbol = attrgetter(side)
+
     if strike is not None and delta is not None:
         print_error('Must specify either delta or strike, but not both.')
         return
@@ -152,92 +201,86 @@ async def call(symbol: str, quantity: int, strike: Optional[Decimal] = None, wid
         return
 
     sesh = RenewableSession()
-    if symbol[0] == '/':  # futures options
-        chain = NestedFutureOptionChain.get_chain(sesh, symbol)
-        if dte is not None:
-            subchain = min(chain.option_chains[0].expirations, 
-                           key=lambda exp: abs(exp.days_to_expiration - dte))
-        else:
-            subchain = choose_futures_expiration(chain, weeklies)
-        tick_size = subchain.tick_sizes[0].value
-    else:
-        chain = NestedOptionChain.get_chain(sesh, symbol)
-        if dte is not None:
-            subchain = min(chain.expirations, 
-                           key=lambda exp: abs((exp.expiration_date - datetime.now().date()).days - dte))
+    chain, streamer = await open_chain_and_streamer(sesh, symbol)
+    async with streamer:
+        if symbol[0] == '/':  # futures options
+            if dte is not None:
+                subchain = min(chain.option_chains[0].expirations, 
+                               key=lambda exp: abs(exp.days_to_expiration - dte))
+            else:
+                subchain = await choose_futures_expiration(chain, weeklies)
+            tick_size = subchain.tick_sizes[0].value
         else:
-            subchain = choose_expiration(chain, weeklies)
-        tick_size = chain.tick_sizes[0].value
-    precision = tick_size.as_tuple().exponent
-    precision = abs(precision) if precision < 0 else ZERO
-    precision_str = f'.{precision}f'
+            if dte is not None:
+                subchain = min(chain.expirations, 
+                               key=lambda exp: abs((exp.expiration_date - datetime.now().date()).days - dte))
+            else:
+                subchain = await choose_expiration(chain, weeklies)
+            tick_size = chain.tick_sizes[0].value
+        precision = tick_size.as_tuple().exponent
+        precision = abs(precision) if precision < 0 else ZERO
+        precision_str = f'.{precision}f'
+
+        by_strike = {s.strike_price: s for s in subchain.strikes}
 
-    async with DXLinkStreamer(sesh) as streamer:
         if not strike:
-            dxfeeds = [s.call_streamer_symbol for s in subchain.strikes]
+            dxfeeds = [streamer_symbol(s) for s in subchain.strikes]
             await streamer.subscribe(EventType.GREEKS, dxfeeds)
-            greeks_dict = await listen_greeks(len(dxfeeds), streamer)
-            greeks = list(greeks_dict.values())
-
-            lowest = 100
-            selected = None
-            for g in greeks:
-                diff = abs(g.delta * Decimal(100) - delta)
-                if diff < lowest:
-                    selected = g
-                    lowest = diff
+            greeks_dict = await listen_greeks(set(dxfeeds), streamer)
+            greeks = [greeks_dict[sym] for sym in dxfeeds]
             # set strike with the closest delta
-            strike = next(s.strike_price for s in subchain.strikes
-                          if s.call_streamer_symbol == selected.eventSymbol)
+            index = closest_delta_index(greeks, delta if is_call else -delta)
+            strike = subchain.strikes[index].strike_price
+        selected_strike = by_strike[strike]
 
         if width:
-            spread_strike = next(s for s in subchain.strikes if s.strike_price == strike + width)
-            await streamer.subscribe(EventType.QUOTE, [selected.eventSymbol, spread_strike.call_streamer_symbol])
-            quote_dict = await listen_quotes(2, streamer)
-            bid = quote_dict[selected.eventSymbol].bidPrice - quote_dict[spread_strike.call_streamer_symbol].askPrice
-            ask = quote_dict[selected.eventSymbol].askPrice - quote_dict[spread_strike.call_streamer_symbol].bidPrice
-            mid = (bid + ask) / Decimal(2)
+            # spreads are built further out of the money
+            spread_strike = by_strike[strike + width if is_call else strike - width]
+            dxfeeds = [streamer_symbol(selected_strike), streamer_symbol(spread_strike)]
+            await streamer.subscribe(EventType.QUOTE, dxfeeds)
+            quote_dict = await listen_quotes(set(dxfeeds), streamer)
+            bid = quote_dict[dxfeeds[0]].bidPrice - quote_dict[dxfeeds[1]].askPrice
+            ask = quote_dict[dxfeeds[0]].askPrice - quote_dict[dxfeeds[1]].bidPrice
+            mid = (bid + ask) / TWO
         else:
-            await streamer.subscribe(EventType.QUOTE, [selected.eventSymbol])
+            await streamer.subscribe(EventType.QUOTE, [streamer_symbol(selected_strike)])
             quote = await streamer.get_event(EventType.QUOTE)
             bid = quote.bidPrice
             ask = quote.askPrice
-            mid = (bid + ask) / Decimal(2)
+            mid = (bid + ask) / TWO
         mid = round_to_width(mid, tick_size)
 
+        tt_symbols = [tt_symbol(selected_strike)]
+        if width:
+            tt_symbols.append(tt_symbol(spread_strike))
+        options_future = fetch_options(sesh, symbol, tt_symbols)
+
         console = Console()
         if width:
             table = Table(show_header=True, header_style='bold', title_style='bold',
-                          title=f'Quote for {symbol} call spread {subchain.expiration_date}')
+                          title=f'Quote for {symbol} {side} spread {subchain.expiration_date}')
         else:
             table = Table(show_header=True, header_style='bold', title_style='bold',
-                          title=f'Quote for {symbol} {strike}C {subchain.expiration_date}')
+                          title=f'Quote for {symbol} {strike}{side[0].upper()} {subchain.expiration_date}')
         table.add_column('Bid', style='green', justify='center')
         table.add_column('Mid', justify='center')
         table.add_column('Ask', style='red', justify='center')
         table.add_row(f'{bid:{precision_str}}', f'{mid:{precision_str}}', f'{ask:{precision_str}}')
         console.print(table)
 
-        price = input('Please enter a limit price per quantity (default mid): ')
+        price = await ainput('Please enter a limit price per quantity (default mid): ')
         price = mid if not price else Decimal(price)
 
-        short_symbol = next(s.call for s in subchain.strikes if s.strike_price == strike)
+        res = await options_future
         if width:
-            if symbol[0] == '/':  # futures options
-                res = FutureOption.get_future_options(sesh, [short_symbol, spread_strike.call])
-            else:
-                res = Option.get_options(sesh, [short_symbol, spread_strike.call])
-            res.sort(key=lambda x: x.strike_price)
+            # selected strike first, spread strike second
+            res.sort(key=lambda x: x.strike_price, reverse=not is_call)
             legs = [
                 res[0].build_leg(abs(quantity), OrderAction.SELL_TO_OPEN if quantity < 0 else OrderAction.BUY_TO_OPEN),
                 res[1].build_leg(abs(quantity), OrderAction.BUY_TO_OPEN if quantity < 0 else OrderAction.SELL_TO_OPEN)
             ]
         else:
-            if symbol[0] == '/':
-                call = FutureOption.get_future_option(sesh, short_symbol)
-            else:
-                call = Option.get_option(sesh, short_symbol)
-            legs = [call.build_leg(abs(quantity), OrderAction.SELL_TO_OPEN if quantity < 0 else OrderAction.BUY_TO_OPEN)]
+            legs = [res[0].build_leg(abs(quantity), OrderAction.SELL_TO_OPEN if quantity < 0 else OrderAction.BUY_TO_OPEN)]
         order = NewOrder(
             time_in_force=OrderTimeInForce.GTC if gtc else OrderTimeInForce.DAY,
             order_type=OrderType.LIMIT,
@@ -247,13 +290,18 @@ async def call(symbol: str, quantity: int, strike: Optional[Decimal] = None, wid
         )
         acc = sesh.get_account()
 
-        data = test_order_handle_errors(acc, sesh, order)
+        # the balances don't depend on the dry run, so fetch them meanwhile; the
+        # dry run is awaited first so its errors are always reported cleanly
+        balances_task = asyncio.create_task(asyncio.to_thread(acc.get_balances, sesh))
+        data = await asyncio.to_thread(test_order_handle_errors, acc, sesh, order)
         if data is None:
+            balances_task.cancel()
             return
+        balances = await balances_task
 
-        nl = acc.get_balances(sesh).net_liquidating_value
+        nl = balances.net_liquidating_value
         bp = data.buying_power_effect.change_in_buying_power
-        percent = bp / nl * Decimal(100)
+        percent = bp / nl * HUNDRED
         fees = data.fee_calculation.total_fees
 
         table = Table(show_header=True, header_style='bold', title_style='bold', title='Order Review')
@@ -266,11 +314,11 @@ async def call(symbol: str, quantity: int, strike: Optional[Decimal] = None, wid
         table.add_column('BP', justify='center')
         table.add_column('BP %', justify='center')
         table.add_column('Fees', justify='center')
-        table.add_row(f'{quantity:+}', symbol, f'${strike:{precision_str}}', 'CALL', f'{subchain.expiration_date}', f'${price:{precision_str}}',
+        table.add_row(f'{quantity:+}', symbol, f'${strike:{precision_str}}', side.upper(), f'{subchain.expiration_date}', f'${price:{precision_str}}',
                       f'${bp:.2f}', f'{percent:.2f}%', f'${fees:.2f}')
         if width:
             table.add_row(f'{-quantity:+}', symbol, f'${spread_strike.strike_price:{precision_str}}',
-                          'CALL', f'{subchain.expiration_date}', '-', '-', '-', '-')
+                          side.upper(), f'{subchain.expiration_date}', '-', '-', '-', '-')
         console.print(table)
 
         if data.warnings:
@@ -279,11 +327,11 @@ async def call(symbol: str, quantity: int, strike: Optional[Decimal] = None, wid
         warn_percent = sesh.config.getint('order', 'bp-warn-above-percent', fallback=None)
         if warn_percent and percent > warn_percent:
             print_warning(f'Buying power usage is above target of {warn_percent}%!')
-        if get_confirmation('Send order? Y/n '):
+        if await asyncio.to_thread(get_confirmation, 'Send order? Y/n '):
             acc.place_order(sesh, order, dry_run=False)
 
 
-@option.command(help='Buy or sell puts with the given parameters.')
+@option.command(help='Buy or sell calls with the given parameters.')
 @click.option('-s', '--strike', type=Decimal, help='The chosen strike for the option.')
 @click.option('-d', '--delta', type=int, help='The chosen delta for the option.')
 @click.option('-w', '--width', type=int, help='Turns the order into a spread with the given width.')
@@ -292,148 +340,23 @@ async def call(symbol: str, quantity: int, strike: Optional[Decimal] = None, wid
 @click.option('--dte', type=int, help='Days to expiration for the option.')
 @click.argument('symbol', type=str)
 @click.argument('quantity', type=int)
-async def put(symbol: str, quantity: int, strike: Optional[int] = None, width: Optional[int] = None,
-              gtc: bool = False, weeklies: bool = False, delta: Optional[int] = None, dte: Optional[int] = None):
-    if strike is not None and delta is not None:
-        print_error('Must specify either delta or strike, but not both.')
-        return
-    elif not strike and not delta:
-        print_error('Please specify either delta or strike for the option.')
-        return
-    elif delta is not None and abs(delta) > 99:
-        print_error('Delta value is too high, -99 <= delta <= 99')
-        return
-
-    sesh = RenewableSession()
-    if symbol[0] == '/':  # futures options
-        chain = NestedFutureOptionChain.get_chain(sesh, symbol)
-        if dte is not None:
-            subchain = min(chain.option_chains[0].expirations, 
-                           key=lambda exp: abs(exp.days_to_expiration - dte))
-        else:
-            subchain = choose_futures_expiration(chain, weeklies)
-        tick_size = subchain.tick_sizes[0].value
-    else:
-        chain = NestedOptionChain.get_chain(sesh, symbol)
-        if dte is not None:
-            subchain = min(chain.expirations, 
-                           key=lambda exp: abs((exp.expiration_date - datetime.now().date()).days - dte))
-        else:
-            subchain = choose_expiration(chain, weeklies)
-        tick_size = chain.tick_sizes[0].value
-    precision = tick_size.as_tuple().exponent
-    precision = abs(precision) if precision < 0 else ZERO
-    precision_str = f'.{precision}f'
-
-    async with DXLinkStreamer(sesh) as streamer:
-        if not strike:
-            dxfeeds = [s.put_streamer_symbol for s in subchain.strikes]
-            await streamer.subscribe(EventType.GREEKS, dxfeeds)
-            greeks_dict = await listen_greeks(len(dxfeeds), streamer)
-            greeks = list(greeks_dict.values())
-
-            lowest = 100
-            selected = None
-            for g in greeks:
-                diff = abs(g.delta * Decimal(100) + delta)
-                if diff < lowest:
-                    selected = g
-                    lowest = diff
-            # set strike with the closest delta
-            strike = next(s.strike_price for s in subchain.strikes
-                          if s.put_streamer_symbol == selected.eventSymbol)
-
-        if width:
-            spread_strike = next(s for s in subchain.strikes if s.strike_price == strike - width)
-            await streamer.subscribe(EventType.QUOTE, [selected.eventSymbol, spread_strike.put_streamer_symbol])
-            quote_dict = await listen_quotes(2, streamer)
-            bid = quote_dict[selected.eventSymbol].bidPrice - quote_dict[spread_strike.put_streamer_symbol].askPrice
-            ask = quote_dict[selected.eventSymbol].askPrice - quote_dict[spread_strike.put_streamer_symbol].bidPrice
-            mid = (bid + ask) / Decimal(2)
-        else:
-            await streamer.subscribe(EventType.QUOTE, [selected.eventSymbol])
-            quote = await streamer.get_event(EventType.QUOTE)
-            bid = quote.bidPrice
-            ask = quote.askPrice
-            mid = (bid + ask) / Decimal(2)
-        mid = round_to_width(mid, tick_size)
-
-        console = Console()
-        if width:
-            table = Table(show_header=True, header_style='bold', title_style='bold',
-                          title=f'Quote for {symbol} put spread {subchain.expiration_date}')
-        else:
-            table = Table(show_header=True, header_style='bold', title_style='bold',
-                          title=f'Quote for {symbol} {strike}P {subchain.expiration_date}')
-        table.add_column('Bid', style='green', justify='center')
-        table.add_column('Mid', justify='center')
-        table.add_column('Ask', style='red', justify='center')
-        table.add_row(f'{bid:{precision_str}}', f'{mid:{precision_str}}', f'{ask:{precision_str}}')
-        console.print(table)
-
-        price = input('Please enter a limit price per quantity (default mid): ')
-        price = mid if not price else Decimal(price)
-
-        short_symbol = next(s.put for s in subchain.strikes if s.strike_price == strike)
-        if width:
-            if symbol[0] == '/':  # futures options
-                res = FutureOption.get_future_options(sesh, [short_symbol, spread_strike.put])
-            else:
-                res = Option.get_options(sesh, [short_symbol, spread_strike.put])
-            res.sort(key=lambda x: x.strike_price, reverse=True)
-            legs = [
-                res[0].build_leg(abs(quantity), OrderAction.SELL_TO_OPEN if quantity < 0 else OrderAction.BUY_TO_OPEN),
-                res[1].build_leg(abs(quantity), OrderAction.BUY_TO_OPEN if quantity < 0 else OrderAction.SELL_TO_OPEN)
-            ]
-        else:
-            if symbol[0] == '/':  # futures options
-                put = FutureOption.get_future_option(sesh, short_symbol)
-            else:
-                put = Option.get_option(sesh, short_symbol)
-            legs = [put.build_leg(abs(quantity), OrderAction.SELL_TO_OPEN if quantity < 0 else OrderAction.BUY_TO_OPEN)]
-        order = NewOrder(
-            time_in_force=OrderTimeInForce.GTC if gtc else OrderTimeInForce.DAY,
-            order_type=OrderType.LIMIT,
-            legs=legs,
-            price=price,
-            price_effect=PriceEffect.CREDIT if quantity < 0 else PriceEffect.DEBIT
-        )
-        acc = sesh.get_account()
-
-        data = test_order_handle_errors(acc, sesh, order)
-        if data is None:
-            return
+async def call(symbol: str, quantity: int, strike: Optional[Decimal] = None, width: Optional[int] = None,
+               gtc: bool = False, weeklies: bool = False, delta: Optional[int] = None, dte: Optional[int] = None):
+    await _single_leg('call', symbol, quantity, strike, width, gtc, weeklies, delta, dte)
 
-        nl = acc.get_balances(sesh).net_liquidating_value
-        bp = data.buying_power_effect.change_in_buying_power
-        percent = bp / nl * Decimal(100)
-        fees = data.fee_calculation.total_fees
 
-        table = Table(show_header=True, header_style='bold', title_style='bold', title='Order Review')
-        table.add_column('Quantity', justify='center')
-        table.add_column('Symbol', justify='center')
-        table.add_column('Strike', justify='center')
-        table.add_column('Type', justify='center')
-        table.add_column('Expiration', justify='center')
-        table.add_column('Price', justify='center')
-        table.add_column('BP', justify='center')
-        table.add_column('BP %', justify='center')
-        table.add_column('Fees', justify='center')
-        table.add_row(f'{quantity:+}', symbol, f'${strike:{precision_str}}', 'PUT', f'{subchain.expiration_date}', f'${price:{precision_str}}',
-                      f'${bp:.2f}', f'{percent:.2f}%', f'${fees:.2f}')
-        if width:
-            table.add_row(f'{-quantity:+}', symbol, f'${spread_strike.strike_price:{precision_str}}',
-                          'PUT', f'{subchain.expiration_date}', '-', '-', '-', '-')
-        console.print(table)
-
-        if data.warnings:
-            for warning in data.warnings:
-                print_warning(warning.message)
-        warn_percent = sesh.config.getint('order', 'bp-warn-above-percent', fallback=None)
-        if warn_percent and percent > warn_percent:
-            print_warning(f'Buying power usage is above target of {warn_percent}%!')
-        if get_confirmation('Send order? Y/n '):
-            acc.place_order(sesh, order, dry_run=False)
+@option.command(help='Buy or sell puts with the given parameters.')
+@click.option('-s', '--strike', type=Decimal, help='The chosen strike for the option.')
+@click.option('-d', '--delta', type=int, help='The chosen delta for the option.')
+@click.option('-w', '--width', type=int, help='Turns the order into a spread with the given width.')
+@click.option('--gtc', is_flag=True, help='Place a GTC order instead of a day order.')
+@click.option('--weeklies', is_flag=True, help='Show all expirations, not just monthlies.')
+@click.option('--dte', type=int, help='Days to expiration for the option.')
+@click.argument('symbol', type=str)
+@click.argument('quantity', type=int)
+async def put(symbol: str, quantity: int, strike: Optional[Decimal] = None, width: Optional[int] = None,
+              gtc: bool = False, weeklies: bool = False, delta: Optional[int] = None, dte: Optional[int] = None):
+    await _single_leg('put', symbol, quantity, strike, width, gtc, weeklies, delta, dte)
 
 
 @option.command(help='Buy or sell strangles with the given parameters.')
@@ -458,64 +381,46 @@ async def strangle(symbol: str, quantity: int, call: Optional[Decimal] = None, w
         return
 
     sesh = RenewableSession()
-    if symbol[0] == '/':  # futures options
-        chain = NestedFutureOptionChain.get_chain(sesh, symbol)
-        subchain = choose_futures_expiration(chain, weeklies)
-        tick_size = subchain.tick_sizes[0].value
-    else:
-        chain = NestedOptionChain.get_chain(sesh, symbol)
-        subchain = choose_expiration(chain, weeklies)
-        tick_size = chain.tick_sizes[0].value
-    precision = tick_size.as_tuple().exponent
-    precision = abs(precision) if precision < 0 else ZERO
-    precision_str = f'.{precision}f'
-
-    async with DXLinkStreamer(sesh) as streamer:
+    chain, streamer = await open_chain_and_streamer(sesh, symbol)
+    async with streamer:
+        if symbol[0] == '/':  # futures options
+            subchain = await choose_futures_expiration(chain, weeklies)
+            tick_size = subchain.tick_sizes[0].value
+        else:
+            subchain = await choose_expiration(chain, weeklies)
+            tick_size = chain.tick_sizes[0].value
+        precision = tick_size.as_tuple().exponent
+        precision = abs(precision) if precision < 0 else ZERO
+        precision_str = f'.{precision}f'
+
+        by_strike = {s.strike_price: s for s in subchain.strikes}
+
         if delta is not None:
-            put_dxf = [s.put_streamer_symbol for s in subchain.strikes]
-            call_dxf = [s.call_streamer_symbol for s in subchain.strikes]
+            put_dxf, call_dxf = map(list, zip(*((s.put_streamer_symbol, s.call_streamer_symbol)
+                                                for s in subchain.strikes)))
             dxfeeds = put_dxf + call_dxf
             await streamer.subscribe(EventType.GREEKS, dxfeeds)
-            greeks_dict = await listen_greeks(len(dxfeeds), streamer)
-            put_greeks = [v for v in greeks_dict.values() if v.eventSymbol in put_dxf]
-            call_greeks = [v for v in greeks_dict.values() if v.eventSymbol in call_dxf]
-
-            lowest = 100
-            selected_put = None
-            for g in put_greeks:
-                diff = abs(g.delta * Decimal(100) + delta)
-                if diff < lowest:
-                    selected_put = g.eventSymbol
-                    lowest = diff
-            lowest = 100
-            selected_call = None
-            for g in call_greeks:
-                diff = abs(g.delta * Decimal(100) - delta)
-                if diff < lowest:
-                    selected_call = g.eventSymbol
-                    lowest = diff
+            greeks_dict = await listen_greeks(set(dxfeeds), streamer)
+            put_greeks = [greeks_dict[sym] for sym in put_dxf]
+            call_greeks = [greeks_dict[sym] for sym in call_dxf]
             # set strike with the closest delta
-            put_strike = next(s for s in subchain.strikes
-                          if s.put_streamer_symbol == selected_put)
-            call_strike = next(s for s in subchain.strikes
-                          if s.call_streamer_symbol == selected_call)
+            put_strike = subchain.strikes[closest_delta_index(put_greeks, -delta)]
+            call_strike = subchain.strikes[closest_delta_index(call_greeks, delta)]
         else:
-            put_strike = next(s for s in subchain.strikes if s.strike_price == put)
-            call_strike = next(s for s in subchain.strikes if s.strike_price == call)
+            put_strike = by_strike[put]
+            call_strike = by_strike[call]
 
         if width:
-            put_spread_strike = next(s for s in subchain.strikes if s.strike_price == put_strike.strike_price - width)
-            call_spread_strike = next(s for s in subchain.strikes if s.strike_price == call_strike.strike_price + width)
-            await streamer.subscribe(
-                EventType.QUOTE,
-                [
-                    call_strike.call_streamer_symbol,
-                    put_strike.put_streamer_symbol,
-                    put_spread_strike.put_streamer_symbol,
-                    call_spread_strike.call_streamer_symbol
-                ]
-            )
-            quote_dict = await listen_quotes(4, streamer)
+            put_spread_strike = by_strike[put_strike.strike_price - width]
+            call_spread_strike = by_strike[call_strike.strike_price + width]
+            dxfeeds = [
+                call_strike.call_streamer_symbol,
+                put_strike.put_streamer_symbol,
+                put_spread_strike.put_streamer_symbol,
+                call_spread_strike.call_streamer_symbol
+            ]
+            await streamer.subscribe(EventType.QUOTE, dxfeeds)
+            quote_dict = await listen_quotes(set(dxfeeds), streamer)
             bid = (quote_dict[call_strike.call_streamer_symbol].bidPrice +
                    quote_dict[put_strike.put_streamer_symbol].bidPrice -
                    quote_dict[put_spread_strike.put_streamer_symbol].askPrice -
@@ -524,15 +429,23 @@ async def strangle(symbol: str, quantity: int, call: Optional[Decimal] = None, w
                    quote_dict[put_strike.put_streamer_symbol].askPrice -
                    quote_dict[put_spread_strike.put_streamer_symbol].bidPrice -
                    quote_dict[call_spread_strike.call_streamer_symbol].bidPrice)
-            mid = (bid + ask) / Decimal(2)
+            mid = (bid + ask) / TWO
         else:
-            await streamer.subscribe(EventType.QUOTE, [put_strike.put_streamer_symbol, call_strike.call_streamer_symbol])
-            quote_dict = await listen_quotes(2, streamer)
-            bid = sum([q.bidPrice for q in quote_dict.values()])
-            ask = sum([q.askPrice for q in quote_dict.values()])
-            mid = (bid + ask) / Decimal(2)
+            dxfeeds = [put_strike.put_streamer_symbol, call_strike.call_streamer_symbol]
+            await streamer.subscribe(EventType.QUOTE, dxfeeds)
+            quote_dict = await listen_quotes(set(dxfeeds), streamer)
+            q1 = quote_dict[put_strike.put_streamer_symbol]
+            q2 = quote_dict[call_strike.call_streamer_symbol]
+            bid = q1.bidPrice + q2.bidPrice
+            ask = q1.askPrice + q2.askPrice
+            mid = (bid + ask) / TWO
         mid = round_to_width(mid, tick_size)
 
+        tt_symbols = [put_strike.put, call_strike.call]
+        if width:
+            tt_symbols += [put_spread_strike.put, call_spread_strike.call]
+        options_future = fetch_options(sesh, symbol, tt_symbols)
+
         console = Console()
         if width:
             table = Table(show_header=True, header_style='bold', title_style='bold',
@@ -546,16 +459,10 @@ async def strangle(symbol: str, quantity: int, call: Optional[Decimal] = None, w
         table.add_row(f'{bid:{precision_str}}', f'{mid:{precision_str}}', f'{ask:{precision_str}}')
         console.print(table)
 
-        price = input('Please enter a limit price per quantity (default mid): ')
+        price = await ainput('Please enter a limit price per quantity (default mid): ')
         price = mid if not price else Decimal(price)
 
-        tt_symbols = [put_strike.put, call_strike.call]
-        if width:
-            tt_symbols += [put_spread_strike.put, call_spread_strike.call]
-        if symbol[0] == '/':  # futures options
-            options = FutureOption.get_future_options(sesh, tt_symbols)
-        else:
-            options = Option.get_options(sesh, tt_symbols)
+        options = await options_future
         options.sort(key=lambda o: o.strike_price)
         q = Decimal(quantity)
         if width:
@@ -579,13 +486,18 @@ async def strangle(symbol: str, quantity: int, call: Optional[Decimal] = None, w
         )
         acc = sesh.get_account()
 
-        data = test_order_handle_errors(acc, sesh, order)
+        # the balances don't depend on the dry run, so fetch them meanwhile; the
+        # dry run is awaited first so its errors are always reported cleanly
+        balances_task = asyncio.create_task(asyncio.to_thread(acc.get_balances, sesh))
+        data = await asyncio.to_thread(test_order_handle_errors, acc, sesh, order)
         if data is None:
+            balances_task.cancel()
             return
+        balances = await balances_task
 
-        nl = acc.get_balances(sesh).net_liquidating_value
+        nl = balances.net_liquidating_value
         bp = data.buying_power_effect.change_in_buying_power
-        percent = bp / nl * Decimal(100)
+        percent = bp / nl * HUNDRED
         fees = data.fee_calculation.total_fees
 
         table = Table(header_style='bold', title_style='bold', title='Order Review')
@@ -651,7 +563,7 @@ async def strangle(symbol: str, quantity: int, call: Optional[Decimal] = None, w
         warn_percent = sesh.config.getint('order', 'bp-warn-above-percent', fallback=None)
         if warn_percent and percent > warn_percent:
             print_warning(f'Buying power usage is above target of {warn_percent}%!')
-        if get_confirmation('Send order? Y/n '):
+        if await asyncio.to_thread(get_confirmation, 'Send order? Y/n '):
             acc.place_order(sesh, order, dry_run=False)
 
 
@@ -663,15 +575,14 @@ async def strangle(symbol: str, quantity: int, call: Optional[Decimal] = None, w
 @click.argument('symbol', type=str)
 async def chain(symbol: str, strikes: int = 8, weeklies: bool = False):
     sesh = RenewableSession()
-    async with DXLinkStreamer(sesh) as streamer:
+    chain, streamer = await open_chain_and_streamer(sesh, symbol)
+    async with streamer:
         if symbol[0] == '/':  # futures options
-            chain = NestedFutureOptionChain.get_chain(sesh, symbol)
-            subchain = choose_futures_expiration(chain, weeklies)
+            subchain = await choose_futures_expiration(chain, weeklies)
             precision = subchain.tick_sizes[0].value.as_tuple().exponent
         else:
-            chain = NestedOptionChain.get_chain(sesh, symbol)
             precision = chain.tick_sizes[0].value.as_tuple().exponent
-            subchain = choose_expiration(chain, weeklies)
+            subchain = await choose_expiration(chain, weeklies)
         precision = abs(precision) if precision < 0 else ZERO
         precision = f'.{precision}f'
 
@@ -714,16 +625,17 @@ async def chain(symbol: str, strikes: int = 8, weeklies: bool = False):
         strike_price = (quote.bidPrice + quote.askPrice) / 2
 
         subchain.strikes.sort(key=lambda s: s.strike_price)
+        strike_prices = [s.strike_price for s in subchain.strikes]
+        mid_index = bisect.bisect_left(strike_prices, strike_price)
         if strikes * 2 < len(subchain.strikes):
-            mid_index = 0
-            while subchain.strikes[mid_index].strike_price < strike_price:
-                mid_index += 1
-            all_strikes = subchain.strikes[mid_index - strikes:mid_index + strikes]
+            # clamp so strikes near the edge of the chain don't wrap around
+            start = max(0, mid_index - strikes)
+            all_strikes = subchain.strikes[start:min(len(subchain.strikes), mid_index + strikes)]
         else:
+            start = 0
             all_strikes = subchain.strikes
 
-        dxfeeds = ([s.call_streamer_symbol for s in all_strikes] +
-                   [s.put_streamer_symbol for s in all_strikes])
+        dxfeeds = [sym for s in all_strikes for sym in (s.call_streamer_symbol, s.put_streamer_symbol)]
         await streamer.subscribe(EventType.QUOTE, dxfeeds)
         await streamer.subscribe(EventType.GREEKS, dxfeeds)
         if show_oi:
@@ -731,19 +643,31 @@ async def chain(symbol: str, strikes: int = 8, weeklies: bool = False):
         if show_volume:
             await streamer.subscribe(EventType.TRADE, dxfeeds)
 
-        greeks_dict = await listen_greeks(len(dxfeeds), streamer)
-        # take into account the symbol we subscribed to
-        quote_dict = await listen_quotes(len(dxfeeds), streamer, skip=symbol if symbol[0] != '/' else future.streamer_symbol)
+        # quotes for the underlying are ignored since it's not expected
+        expected = set(dxfeeds)
+        # drain all the event types at once instead of one after another
+        greeks_task = asyncio.create_task(listen_greeks(expected, streamer))
+        quote_task = asyncio.create_task(listen_quotes(expected, streamer))
+        if show_oi:
+            summary_task = asyncio.create_task(listen_summaries(expected, streamer))
+        if show_volume:
+            trade_task = asyncio.create_task(listen_trades(expected, streamer))
+        greeks_dict = await greeks_task
+        quote_dict = await quote_task
         if show_oi:
-            summary_dict = await listen_summaries(len(dxfeeds), streamer)
+            summary_dict = await summary_task
         if show_volume:
-            trade_dict = await listen_trades(len(dxfeeds), streamer)
+            trade_dict = await trade_task
 
+        atm_row = mid_index - start - 1
         for i, strike in enumerate(all_strikes):
-            put_bid = quote_dict[strike.put_streamer_symbol].bidPrice
-            put_ask = quote_dict[strike.put_streamer_symbol].askPrice
-            call_bid = quote_dict[strike.call_streamer_symbol].bidPrice
-            call_ask = quote_dict[strike.call_streamer_symbol].askPrice
+            # floats are much cheaper to format than Decimals
+            put_quote = quote_dict[strike.put_streamer_symbol]
+            call_quote = quote_dict[strike.call_streamer_symbol]
+            put_bid = float(put_quote.bidPrice)
+            put_ask = float(put_quote.askPrice)
+            call_bid = float(call_quote.bidPrice)
+            call_ask = float(call_quote.askPrice)
             row = [
                 f'{call_bid:{precision}}',
                 f'{call_ask:{precision}}',
@@ -769,6 +693,6 @@ async def chain(symbol: str, strikes: int = 8, weeklies: bool = False):
                 row.append(f'{trade_dict[strike.call_streamer_symbol].dayVolume}')
 
             prepend.reverse()
-            table.add_row(*(prepend + row), end_section=(i == strikes - 1))
+            table.add_row(*(prepend + row), end_section=(i == atm_row))
 
         console.print(table)
@@ -1,14 +1,18 @@
+import asyncio
 import getpass
+import json
 import logging
 import os
-import pickle
 import shutil
+import tempfile
 from configparser import ConfigParser
+from contextlib import suppress
 from datetime import date
 from decimal import Decimal
 from importlib.resources import as_file, files
 from typing import Optional
 
+import requests
 from rich import print as rich_print
 from tastytrade import Account, Session
 from tastytrade.order import NewOrder, PlacedOrderResponse
@@ -16,11 +20,15 @@ from tastytrade.order import NewOrder, PlacedOrderResponse
 logger = logging.getLogger(__name__)
 VERSION = '0.2'
 ZERO = Decimal(0)
+TWO = Decimal(2)
+HUNDRED = Decimal(100)
 
 CONTEXT_SETTINGS = {'help_option_names': ['-h', '--help']}
 
 CUSTOM_CONFIG_PATH = '.config/ttcli/ttcli.cfg'
 TOKEN_PATH = '.config/ttcli/.session'
+SESSION_FIELDS = ('is_test', 'base_url', 'user', 'session_token', 'remember_token',
+                  'streamer_token', 'dxlink_url')
 
 
 def print_error(msg: str):
@@ -31,17 +39,32 @@ def print_warning(msg: str):
     rich_print(f'[light_coral]Warning: {msg}[/light_coral]')
 
 
+def write_atomic(path: str, data: str):
+    # write to a unique temp file and swap it in, so neither a crash nor a
+    # concurrent writer can leave a torn file behind
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
 def test_order_handle_errors(
     account: Account,
     session: 'RenewableSession',
     order: NewOrder
 ) -> Optional[PlacedOrderResponse]:
     url = f'{session.base_url}/accounts/{account.account_number}/orders/dry-run'
-    json = order.model_dump_json(exclude_none=True, by_alias=True)
-    response = session.client.post(url, data=json)
+    payload = order.model_dump_json(exclude_none=True, by_alias=True)
+    response = session.client.post(url, data=payload)
+    body = response.json()
     # modified to use our error handling
     if response.status_code // 100 != 2:
-        content = response.json()['error']
+        content = body['error']
         print_error(f"{content['message']}")
         errors = content.get('errors')
         if errors is not None:
@@ -52,34 +75,28 @@ def test_order_handle_errors(
                     print_error(f"{error['reason']}")
         return None
     else:
-        data = response.json()['data']
+        data = body['data']
         return PlacedOrderResponse(**data)
 
 
 class RenewableSession(Session):
     def __init__(self):
-        custom_path = os.path.join(os.path.expanduser('~'), CUSTOM_CONFIG_PATH)
+        home = os.path.expanduser('~')
+        custom_path = os.path.join(home, CUSTOM_CONFIG_PATH)
         data_file = files('ttcli.data').joinpath('ttcli.cfg')
-        token_path = os.path.join(os.path.expanduser('~'), TOKEN_PATH)
-
-        logged_in = False
-        # try to load token
-        if os.path.exists(token_path):
-            with open(token_path, 'rb') as f:
-                self.__dict__ = pickle.load(f)
+        token_path = os.path.join(home, TOKEN_PATH)
 
-            # make sure token hasn't expired
-            logged_in = self.validate()
+        # try to load token, making sure it hasn't expired
+        logged_in = self._load_token(token_path) and self.validate()
 
         # load config
         self.config = ConfigParser()
-        if not os.path.exists(custom_path):
+        if not self.config.read(custom_path):
             with as_file(data_file) as path:
                 # copy default config to user home dir
                 os.makedirs(os.path.dirname(custom_path), exist_ok=True)
                 shutil.copyfile(path, custom_path)
-                self.config.read(path)
-        self.config.read(custom_path)
+            self.config.read(custom_path)
 
         if not logged_in:
             # either the token expired or doesn't exist
@@ -90,11 +107,34 @@ class RenewableSession(Session):
             self.accounts = [acc for acc in accounts if not acc.is_closed]
             # write session token to cache
             os.makedirs(os.path.dirname(token_path), exist_ok=True)
-            with open(token_path, 'wb') as f:
-                pickle.dump(self.__dict__, f)
+            self._save_token(token_path)
             logger.debug('Logged in with new session, cached for next login.')
         else:
             logger.debug('Logged in with cached session.')
+        self._accounts_by_number = {acc.account_number: acc for acc in self.accounts}
+
+    def _load_token(self, token_path: str) -> bool:
+        try:
+            with open(token_path) as f:
+                state = json.load(f)
+            self.accounts = [Account.model_validate(acc) for acc in state.pop('accounts')]
+            headers = state.pop('headers')
+        except FileNotFoundError:
+            return False
+        except (ValueError, KeyError, TypeError):
+            # unreadable, or a session pickled by an older version
+            logger.debug('Ignoring unreadable cached session.')
+            return False
+        self.__dict__.update(state)
+        self.client = requests.Session()
+        self.client.headers.update(headers)
+        return True
+
+    def _save_token(self, token_path: str):
+        state = {field: getattr(self, field) for field in SESSION_FIELDS}
+        state['headers'] = dict(self.client.headers)
+        state['accounts'] = [acc.model_dump(mode='json') for acc in self.accounts]
+        write_atomic(token_path, json.dumps(state))
 
     def _get_credentials(self):
         username = os.getenv('TT_USERNAME')
@@ -113,17 +153,16 @@ class RenewableSession(Session):
     def get_account(self) -> Account:
         account = self.config['general'].get('default-account', None)
         if account:
-            try:
-                return next(a for a in self.accounts if a.account_number == account)
-            except StopIteration:
-                print_warning('Default account is set, but the account doesn\'t appear to exist!')
-
-        for i in range(len(self.accounts)):
-            if i == 0:
-                print(f'{i + 1}) {self.accounts[i].account_number} '
-                      f'{self.accounts[i].nickname} (default)')
-            else:
-                print(f'{i + 1}) {self.accounts[i].account_number} {self.accounts[i].nickname}')
+            acc = self._accounts_by_number.get(account)
+            if acc:
+                return acc
+            print_warning('Default account is set, but the account doesn\'t appear to exist!')
+
+        print('\n'.join(
+            f'{i + 1}) {acc.account_number} {acc.nickname} (default)' if i == 0
+            else f'{i + 1}) {acc.account_number} {acc.nickname}'
+            for i, acc in enumerate(self.accounts)
+        ))
         choice = 0
         while choice not in range(1, len(self.accounts) + 1):
             try:
@@ -134,17 +173,18 @@ class RenewableSession(Session):
         return self.accounts[choice - 1]
 
 
+async def ainput(prompt: str) -> str:
+    return await asyncio.to_thread(input, prompt)
+
+
 def is_monthly(day: date) -> bool:
     return day.weekday() == 4 and 15 <= day.day <= 21
 
 
 def get_confirmation(prompt: str, default: bool = True) -> bool:
+    answers = {'y': True, 'n': False, '': default}
     while True:
-        answer = input(prompt).lower()
-        if not answer:
-            return default
-        if answer[0] == 'y':
-            return True
-        if answer[0] == 'n':
-            return False
+        answer = input(prompt)[:1].lower()
+        if answer in answers:
+            return answers[answer]
 